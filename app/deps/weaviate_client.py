@@ -1,4 +1,7 @@
 import os
+import json
+import threading
+import time
 from functools import lru_cache
 import weaviate
 from weaviate.classes.config import Configure, Property, DataType, VectorDistances
@@ -6,6 +9,13 @@ from weaviate.classes.tenants import Tenant
 from weaviate.exceptions import WeaviateBaseError
 
 COLLECTION_NAME = "DocChunk"
+# alias que usa el servicio cuando existe (lo crea app.rag.reindex); si no, se usa COLLECTION_NAME
+COLLECTION_ALIAS = "DocChunkLive"
+# cada cuánto se vuelve a resolver el alias (y el modelo guardado en la colección)
+ACTIVE_COLLECTION_TTL = float(os.getenv("ACTIVE_COLLECTION_TTL", "30"))
+
+_active_lock = threading.Lock()
+_active_cache: dict = {"at": None, "value": None}
 
 def _is_local_url(url: str) -> bool:
     return url.startswith("http://localhost") or url.startswith("http://127.0.0.1") or url.startswith("http://0.0.0.0")
@@ -44,19 +54,60 @@ def _collection_exists(name: str) -> bool:
         except Exception:
             return False
         
-def ensure_collection():
+DOC_CHUNK_PROPERTIES = [
+    Property(name="text", data_type=DataType.TEXT),
+    Property(name="source", data_type=DataType.TEXT),
+    Property(name="chunk_index", data_type=DataType.INT),
+]
+
+def _alias_target(name: str) -> str | None:
+    """Si `name` es un alias, devuelve la colección a la que apunta; si no, None."""
     client = get_wv_client()
-    if _collection_exists(COLLECTION_NAME):
-        return
+    alias_api = getattr(client, "alias", None)  # weaviate-client >= 4.16
+    if alias_api is None:
+        return None
+    try:
+        alias = alias_api.get(alias_name=name)
+    except Exception:
+        # servidor sin soporte de alias (< 1.32)
+        return None
+    return alias.collection if alias else None
 
+def _collection_embedding_model(name: str) -> str | None:
+    """Modelo de embeddings guardado en la descripción de la colección (ver create_collection)."""
+    try:
+        desc = get_wv_client().collections.get(name).config.get().description
+        return json.loads(desc).get("embedding_model") if desc else None
+    except Exception:
+        # colecciones antiguas sin descripción -> se usa EMBEDDING_MODEL
+        return None
+
+def active_collection() -> tuple[str, str | None]:
+    """
+    (colección que sirve el servicio, su modelo de embeddings o None).
+    Se cachea ACTIVE_COLLECTION_TTL segundos para no consultar el alias en cada request.
+    """
+    with _active_lock:
+        at = _active_cache["at"]
+        if at is not None and time.monotonic() - at < ACTIVE_COLLECTION_TTL:
+            return _active_cache["value"]
+        name = _alias_target(COLLECTION_ALIAS) or COLLECTION_NAME
+        value = (name, _collection_embedding_model(name))
+        _active_cache.update(at=time.monotonic(), value=value)
+        return value
+
+def resolve_collection_name() -> str:
+    """Colección real que sirve el servicio: destino de COLLECTION_ALIAS o COLLECTION_NAME."""
+    return active_collection()[0]
+
+def create_collection(name: str, embedding_model: str | None = None):
+    client = get_wv_client()
     try:
         client.collections.create(
-            name=COLLECTION_NAME,
-            properties=[
-                Property(name="text", data_type=DataType.TEXT),
-                Property(name="source", data_type=DataType.TEXT),
-                Property(name="chunk_index", data_type=DataType.INT),
-            ],
+            name=name,
+            # el servicio lee de aquí el modelo con el que se generaron los vectores
+            description=json.dumps({"embedding_model": embedding_model}) if embedding_model else None,
+            properties=DOC_CHUNK_PROPERTIES,
             # ❌ vector_config=Configure.Vector(...)  ->  ✅ usar estos dos:
             vectorizer_config=Configure.Vectorizer.none(),
             vector_index_config=Configure.VectorIndex.hnsw(
@@ -64,15 +115,17 @@ def ensure_collection():
             ),
             multi_tenancy_config=Configure.multi_tenancy(enabled=True),
         )
-        client.collections.get(COLLECTION_NAME)  # fuerza lazy init
+        client.collections.get(name)  # fuerza lazy init
     except WeaviateBaseError as e:
-        raise RuntimeError(f"No se pudo crear la colección '{COLLECTION_NAME}': {e}")
+        raise RuntimeError(f"No se pudo crear la colección '{name}': {e}")
 
-def ensure_tenant(nickname: str):
-    ensure_collection()
-    client = get_wv_client()
-    col = client.collections.get(COLLECTION_NAME)
+def ensure_collection():
+    if resolve_collection_name() != COLLECTION_NAME or _collection_exists(COLLECTION_NAME):
+        return
+    create_collection(COLLECTION_NAME)
 
+def add_tenant(col, nickname: str):
+    """Crea el tenant en `col`; idempotente si ya existe."""
     try:
         if hasattr(col.tenants, "create"):
             col.tenants.create(Tenant(name=nickname))
@@ -86,23 +139,18 @@ def ensure_tenant(nickname: str):
         if "already exists" in msg or "conflict" in msg:
             return
         if "class not found" in msg:
-            raise RuntimeError("La colección DocChunk no existe (class not found). Revisa ensure_collection().")
+            raise RuntimeError(f"La colección {col.name} no existe (class not found). Revisa ensure_collection().")
         raise
 
-def delete_tenant(nickname: str):
+def ensure_tenant(nickname: str, collection: str | None = None):
     ensure_collection()
     client = get_wv_client()
-    col = client.collections.get(COLLECTION_NAME)
-
-    # si no existe, idempotente
-    try:
-        existing = [t.name for t in (col.tenants.get() or [])]
-        if nickname not in existing:
-            return
-    except Exception:
-        # si falla get(), intentamos borrar igual
-        pass
+    # operaciones de tenants van contra la colección real, no el alias
+    col = client.collections.get(collection or resolve_collection_name())
+    add_tenant(col, nickname)
 
+def remove_tenant(col, nickname: str):
+    """Borra el tenant de `col` (y sus objetos)."""
     # métodos posibles: delete / remove
     if hasattr(col.tenants, "delete"):
         col.tenants.delete(nickname)
@@ -116,4 +164,39 @@ def delete_tenant(nickname: str):
         col.delete_tenant(nickname)
         return
 
-    raise RuntimeError("Tu SDK de Weaviate no expone delete/remove para tenants. Actualiza a weaviate-client >= 4.9.")
\ No newline at end of file
+    raise RuntimeError("Tu SDK de Weaviate no expone delete/remove para tenants. Actualiza a weaviate-client >= 4.9.")
+
+def delete_tenant(nickname: str):
+    ensure_collection()
+    client = get_wv_client()
+    col = client.collections.get(resolve_collection_name())
+
+    # si no existe, idempotente
+    try:
+        existing = [t.name for t in (col.tenants.get() or [])]
+        if nickname not in existing:
+            return
+    except Exception:
+        # si falla get(), intentamos borrar igual
+        pass
+
+    remove_tenant(col, nickname)
+
+def switch_alias(target: str):
+    """
+    Apunta COLLECTION_ALIAS a `target` (atómico en el servidor). La primera vez crea el alias;
+    la colección anterior no se toca, así que un fallo aquí deja el servicio como estaba.
+    """
+    client = get_wv_client()
+    if not hasattr(client, "alias"):
+        raise RuntimeError("Tu SDK de Weaviate no soporta alias. Actualiza a weaviate-client >= 4.16.")
+
+    try:
+        if _alias_target(COLLECTION_ALIAS):
+            client.alias.update(alias_name=COLLECTION_ALIAS, new_target_collection=target)
+        else:
+            client.alias.create(alias_name=COLLECTION_ALIAS, target_collection=target)
+    except WeaviateBaseError as e:
+        raise RuntimeError(f"No se pudo apuntar el alias '{COLLECTION_ALIAS}' a '{target}': {e}")
+    with _active_lock:
+        _active_cache.update(at=None, value=None)
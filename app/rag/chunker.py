@@ -27,6 +27,13 @@ def _decode(tokens: List[int], model_hint: Optional[str] = None) -> str:
     enc = _get_encoding_for_model(model_hint or "")
     return enc.decode(tokens)
 
+def count_tokens(text: str, model_hint: Optional[str] = None) -> int:
+    """Número de tokens de `text` (aprox 4 chars ~ 1 token si no hay tiktoken)."""
+    toks = _encode(text, model_hint=model_hint)
+    if toks is None:
+        return len(text) // 4 + 1
+    return len(toks)
+
 def chunk_text(
     text: str,
     size_tokens: int = 400,
@@ -0,0 +1,575 @@
+# app/rag/reindex.py
+"""
+Re-embedding offline de todos los tenants de la colección activa hacia una colección nueva.
+
+Sirve para cambiar EMBEDDING_MODEL o el esquema de DocChunk sin que cada dueño tenga que
+volver a subir su contenido. Los chunks se copian tal cual (mismo uuid, texto y propiedades),
+solo se recalcula el vector. Al terminar, el alias COLLECTION_ALIAS pasa a apuntar a la
+colección nueva; la anterior no se borra. El modelo usado queda guardado en la descripción
+de la colección nueva y el servicio lo lee de ahí (app.deps.weaviate_client.active_collection),
+así que consultas e ingestas cambian de modelo junto con el alias: no hay que cambiar
+EMBEDDING_MODEL en el servicio (solo se usa para colecciones sin modelo guardado, como el
+DocChunk original). El servicio re-lee el alias cada ACTIVE_COLLECTION_TTL segundos.
+
+Uso:
+    EMBEDDING_MODEL=text-embedding-3-small python -m app.rag.reindex --checkpoint reindex.jsonl
+
+- Streaming: cada tenant se lee con el iterador por cursor de Weaviate; en memoria solo hay
+  `concurrency * 2` lotes en vuelo, nunca un tenant completo.
+- Checkpoint: archivo JSONL append-only (cabecera + una línea por tenant). Si el proceso
+  muere, relanzar el mismo comando retoma desde los tenants pendientes; como se reutilizan
+  los uuid, reescribir un tenant a medias es idempotente.
+- Reconciliación: antes del switch se vuelve a listar el origen, se borran del destino los
+  tenants que ya no existen y se re-copian los que difieren en su conjunto de uuids
+  (huella: número de objetos + XOR de los uuid, calculada en paralelo y en streaming).
+  Se repite hasta que una ronda no encuentra diferencias y entonces se cambia el alias.
+  Un tenant modificado después de ser comprobado en esa última ronda no se copia: la
+  ventana es la duración de la ronda completa, así que conviene correrlo con poco tráfico.
+- Tenants no activos: INACTIVE se activa temporalmente con --activate-inactive y vuelve a
+  su estado (origen y destino) en cuanto termina de copiarse; el estado original queda en
+  el checkpoint para restaurarlo si el proceso muere. OFFLOADED hay que recargarlos antes.
+  Mientras haya tenants omitidos o fallidos no se cambia el alias.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Tuple
+
+from dotenv import load_dotenv, find_dotenv
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from weaviate.classes.data import DataObject
+from weaviate.classes.tenants import Tenant, TenantActivityStatus
+
+from ..deps.weaviate_client import (
+    COLLECTION_ALIAS,
+    COLLECTION_NAME,
+    DOC_CHUNK_PROPERTIES,
+    _collection_exists,
+    add_tenant,
+    create_collection,
+    get_wv_client,
+    remove_tenant,
+    resolve_collection_name,
+    switch_alias,
+)
+from .chunker import count_tokens
+from .service import default_embed_model, embed
+
+# (tenant, uuid, properties)
+Item = Tuple[str, str, dict]
+
+HEADER_KEYS = ("source", "target", "model")
+
+# estados que obligan a copiar el tenant de nuevo
+_RESET_STATUSES = {"failed", "skipped", "stale"}
+
+_TRANSIENT_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+# nombres antiguos de los estados de tenant
+_LEGACY_STATUS = {"HOT": "ACTIVE", "COLD": "INACTIVE", "FROZEN": "OFFLOADED"}
+
+
+class RateLimiter:
+    """Token bucket por segundo, compartido entre hilos. rate <= 0 => sin límite."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._allowance = rate
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n: int):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate)
+            self._last = now
+            # se permite quedar en negativo: un lote mayor que `rate` simplemente espera más
+            self._allowance -= n
+            delay = -self._allowance / self.rate if self._allowance < 0 else 0.0
+        if delay:
+            time.sleep(delay)
+
+
+class Checkpoint:
+    """JSONL append-only: primera línea = cabecera, luego {"tenant", "status", ...} por tenant."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.header: dict | None = None
+        self.done: set[str] = set()
+        # tenants activados por el reindex y aún no devueltos a su estado original
+        self.activated: Dict[str, str] = {}
+        if os.path.exists(path):
+            self._load()
+        self._fh = None
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    # línea truncada por un crash
+                    continue
+                if self.header is None:
+                    if not all(k in rec for k in HEADER_KEYS):
+                        raise RuntimeError(f"Checkpoint {self.path} corrupto: falta la cabecera.")
+                    self.header = rec
+                else:
+                    self._apply(rec)
+
+    def _apply(self, rec: dict):
+        tenant, status = rec["tenant"], rec.get("status")
+        if status == "done":
+            self.done.add(tenant)
+        elif status in _RESET_STATUSES:
+            self.done.discard(tenant)
+        elif status == "activated":
+            self.activated[tenant] = rec["activity_status"]
+        elif status == "restored":
+            self.activated.pop(tenant, None)
+
+    def open(self, header: dict):
+        self._fh = open(self.path, "a", encoding="utf-8")
+        if self._fh.tell() and not self._ends_with_newline():
+            # cerrar la línea truncada para no pegarle el siguiente registro
+            self._fh.write("\n")
+        if self.header is None:
+            self.header = header
+            self._write(header)
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as fh:
+            fh.seek(-1, os.SEEK_END)
+            return fh.read(1) == b"\n"
+
+    def record(self, tenant: str, status: str, **extra):
+        rec = {"tenant": tenant, "status": status, **extra}
+        self._apply(rec)
+        self._write(rec)
+
+    def _write(self, rec: dict):
+        self._fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._fh.flush()
+
+    def close(self):
+        if self._fh:
+            self._fh.close()
+
+
+class Progress:
+    def __init__(self, every: float):
+        self.every = every
+        self.total_tenants = 0
+        self.tenants = 0
+        self.failed = 0
+        self.chunks = 0
+        self._start = time.monotonic()
+        self._last = self._start
+
+    def maybe_report(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last < self.every:
+            return
+        self._last = now
+        rate = self.chunks / max(now - self._start, 1e-6)
+        print(
+            f"[reindex] tenants {self.tenants}/{self.total_tenants} · chunks {self.chunks} "
+            f"· {rate:.1f} chunks/s · fallidos {self.failed}",
+            flush=True,
+        )
+
+
+def _status(tenant) -> str:
+    s = getattr(tenant, "activity_status", None)
+    s = getattr(s, "value", s) or "ACTIVE"
+    return _LEGACY_STATUS.get(s, s)
+
+
+def _tenants(col) -> Dict[str, str]:
+    """{nombre: estado} de todos los tenants de `col`, ordenados por nombre."""
+    return {name: _status(t) for name, t in sorted(col.tenants.get().items())}
+
+
+def _set_status(col, tenant: str, status: str):
+    col.tenants.update(Tenant(name=tenant, activity_status=TenantActivityStatus(status)))
+
+
+def _fingerprint(col, tenant: str, page_size: int) -> Tuple[int, int]:
+    """(número de objetos, XOR de sus uuid): no depende del orden ni guarda los uuid en memoria."""
+    n, acc = 0, 0
+    for obj in col.with_tenant(tenant).iterator(return_properties=[], cache_size=page_size):
+        n += 1
+        acc ^= uuid.UUID(str(obj.uuid)).int
+    return n, acc
+
+
+def _iter_chunks(col, tenant: str, props: List[str], page_size: int) -> Iterator[Item]:
+    scoped = col.with_tenant(tenant)
+    for obj in scoped.iterator(return_properties=props, cache_size=page_size):
+        yield tenant, obj.uuid, obj.properties or {}
+
+
+class Reindexer:
+    def __init__(
+        self,
+        src,
+        dst,
+        checkpoint: Checkpoint,
+        model: str,
+        batch_size: int = 256,
+        concurrency: int = 8,
+        tokens_per_min: float = 0,
+        page_size: int = 500,
+        report_every: float = 10.0,
+        retries: int = 5,
+        backoff: float = 1.0,
+        activate_inactive: bool = False,
+    ):
+        self.src = src
+        self.dst = dst
+        self.props = [p.name for p in DOC_CHUNK_PROPERTIES]
+        self.ckpt = checkpoint
+        self.model = model
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.retries = retries
+        self.backoff = backoff
+        self.activate_inactive = activate_inactive
+        self.limiter = RateLimiter(tokens_per_min / 60)
+        self.progress = Progress(report_every)
+
+        # estado por tenant en vuelo: lotes pendientes, lectura terminada, chunks escritos
+        self._pending: Dict[str, int] = {}
+        self._exhausted: set[str] = set()
+        self._written: Dict[str, int] = {}
+        self.failed: Dict[str, str] = {}
+        self.skipped: Dict[str, str] = {}
+
+    def _embed_batch(self, items: List[Item]) -> List[List[float] | None]:
+        """Vectores de `items`; los chunks sin texto se copian sin vector."""
+        texts = [props.get("text") or "" for _, _, props in items]
+        idx = [i for i, t in enumerate(texts) if t.strip()]
+        vectors: List[List[float] | None] = [None] * len(items)
+        if not idx:
+            return vectors
+        batch = [texts[i] for i in idx]
+        self.limiter.acquire(sum(count_tokens(t, model_hint=self.model) for t in batch))
+        for attempt in range(self.retries + 1):
+            try:
+                embedded = embed(batch, model=self.model)
+                break
+            except _TRANSIENT_ERRORS:
+                if attempt == self.retries:
+                    raise
+                time.sleep(min(60.0, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0))
+        for i, v in zip(idx, embedded):
+            vectors[i] = v
+        return vectors
+
+    def _write_batch(self, items: List[Item], vectors: List[List[float] | None]):
+        by_tenant: Dict[str, List[DataObject]] = {}
+        for (tenant, uid, props), vec in zip(items, vectors):
+            if tenant in self.failed:
+                continue
+            by_tenant.setdefault(tenant, []).append(DataObject(properties=props, vector=vec, uuid=uid))
+        for tenant, objs in by_tenant.items():
+            try:
+                res = self.dst.with_tenant(tenant).data.insert_many(objs)
+                if res.errors:
+                    first = next(iter(res.errors.values()))
+                    raise RuntimeError(f"{len(res.errors)} objetos con error: {first.message}")
+            except Exception as e:
+                self._fail(tenant, e)
+                continue
+            self._written[tenant] = self._written.get(tenant, 0) + len(objs)
+            self.progress.chunks += len(objs)
+
+    def _fail(self, tenant: str, err: Exception):
+        if tenant in self.failed:
+            return
+        self.failed[tenant] = str(err)
+        self.ckpt.record(tenant, "failed", error=str(err))
+        self.progress.failed += 1
+
+    def _skip(self, tenant: str, status: str):
+        self.skipped[tenant] = status
+        self.ckpt.record(tenant, "skipped", activity_status=status)
+
+    def _restore(self, tenant: str, copied: bool):
+        """Devuelve a su estado original un tenant activado por el reindex."""
+        status = self.ckpt.activated.get(tenant)
+        if status is None:
+            return
+        _set_status(self.src, tenant, status)
+        if copied:
+            _set_status(self.dst, tenant, status)
+        self.ckpt.record(tenant, "restored")
+
+    def _restore_pending(self):
+        """Tras un crash: restaura los tenants que quedaron activados en la ejecución anterior."""
+        dst = _tenants(self.dst)
+        for tenant in list(self.ckpt.activated):
+            try:
+                self._restore(tenant, copied=tenant in dst)
+            except Exception as e:
+                # p.ej. el tenant se borró entretanto
+                print(f"[reindex] no se pudo restaurar el estado de '{tenant}': {e}", file=sys.stderr)
+
+    def _settle(self, tenant: str):
+        if tenant not in self._exhausted or self._pending.get(tenant, 0):
+            return
+        self._exhausted.discard(tenant)
+        self._pending.pop(tenant, None)
+        n = self._written.pop(tenant, 0)
+        try:
+            self._restore(tenant, copied=tenant not in self.failed)
+        except Exception as e:
+            self._fail(tenant, e)
+        if tenant in self.failed:
+            return
+        self.ckpt.record(tenant, "done", chunks=n)
+        self.progress.tenants += 1
+
+    def _submit(self, pool, inflight: dict, items: List[Item]):
+        # cada tenant del buffer ya tiene su +1 en _pending (ver _copy); pasa al lote
+        tenants = list(dict.fromkeys(t for t, _, _ in items))  # en orden de lectura
+        inflight[pool.submit(self._embed_batch, items)] = (items, tenants)
+        if len(inflight) >= self.concurrency * 2:
+            self._drain(inflight, return_when=FIRST_COMPLETED)
+
+    def _drain(self, inflight: dict, return_when=ALL_COMPLETED):
+        finished, _ = wait(list(inflight), return_when=return_when)
+        for fut in finished:
+            items, tenants = inflight.pop(fut)
+            try:
+                self._write_batch(items, fut.result())
+            except Exception as e:
+                for t in tenants:
+                    self._fail(t, e)
+            for t in tenants:
+                self._pending[t] -= 1
+                self._settle(t)
+        self.progress.maybe_report()
+
+    def _copy(self, tenants: Dict[str, str]):
+        """Copia `tenants` ({nombre: estado en origen}) al destino."""
+        inflight: dict = {}
+        buf: List[Item] = []
+        # un tenant con chunks en `buf` sigue pendiente hasta que se escriba ese lote
+        buffered: set[str] = set()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for tenant, status in tenants.items():
+                self.failed.pop(tenant, None)
+                self.skipped.pop(tenant, None)
+                reactivate = status == "INACTIVE" and self.activate_inactive
+                if status != "ACTIVE" and not reactivate:
+                    self._skip(tenant, status)
+                    continue
+                try:
+                    if reactivate:
+                        # primero al checkpoint, para poder restaurarlo si morimos aquí
+                        self.ckpt.record(tenant, "activated", activity_status=status)
+                        _set_status(self.src, tenant, "ACTIVE")
+                    add_tenant(self.dst, tenant)
+                    if reactivate:
+                        # puede venir de una ejecución anterior que ya lo dejó INACTIVE
+                        _set_status(self.dst, tenant, "ACTIVE")
+                    for item in _iter_chunks(self.src, tenant, self.props, self.page_size):
+                        if tenant not in buffered:
+                            buffered.add(tenant)
+                            self._pending[tenant] = self._pending.get(tenant, 0) + 1
+                        buf.append(item)
+                        if len(buf) >= self.batch_size:
+                            self._submit(pool, inflight, buf)
+                            buf, buffered = [], set()
+                except Exception as e:
+                    self._fail(tenant, e)
+                self._exhausted.add(tenant)
+                self._settle(tenant)
+            if buf:
+                self._submit(pool, inflight, buf)
+            if inflight:
+                self._drain(inflight)
+
+    def run(self):
+        attempted: set[str] = set()
+        self._restore_pending()
+        self.progress.tenants = len(self.ckpt.done)
+        # pasadas extra para los tenants creados mientras corría la anterior
+        while True:
+            todo = {t: s for t, s in _tenants(self.src).items() if t not in self.ckpt.done and t not in attempted}
+            if not todo:
+                break
+            self.progress.total_tenants = len(self.ckpt.done) + len(todo)
+            attempted.update(todo)
+            self._copy(todo)
+        self.progress.maybe_report(force=True)
+
+    def _same(self, tenant: str) -> bool:
+        try:
+            return _fingerprint(self.src, tenant, self.page_size) == _fingerprint(self.dst, tenant, self.page_size)
+        except Exception:
+            return False
+
+    def _diff(self, src: Dict[str, str], dst: Dict[str, str]) -> Tuple[List[str], Dict[str, str]]:
+        """(tenants sobrantes en destino, tenants a re-copiar)."""
+        stale = [t for t in dst if t not in src]
+        recopy: Dict[str, str] = {}
+        to_check: List[str] = []
+        for tenant, status in src.items():
+            if tenant in self.failed or tenant in self.skipped:
+                continue
+            if tenant not in dst:
+                recopy[tenant] = status
+            elif status == "ACTIVE":
+                to_check.append(tenant)
+            # sin activar no se puede leer, pero tampoco admite escrituras
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for tenant, same in zip(to_check, pool.map(self._same, to_check)):
+                if not same:
+                    recopy[tenant] = src[tenant]
+        return stale, recopy
+
+    def reconcile(self, max_rounds: int = 5) -> bool:
+        """Iguala el destino con el origen actual. True si una ronda no encontró diferencias."""
+        for _ in range(max_rounds):
+            src = _tenants(self.src)
+            for tenant in list(self.failed):
+                if tenant not in src:
+                    del self.failed[tenant]
+            for tenant in list(self.skipped):
+                if tenant not in src:
+                    del self.skipped[tenant]
+
+            dst = _tenants(self.dst)
+            stale, recopy = self._diff(src, dst)
+            if not stale and not recopy:
+                return True
+            print(f"[reindex] reconciliando: {len(stale)} borrados, {len(recopy)} a re-copiar", flush=True)
+            # re-copiar desde cero: así también desaparecen los objetos borrados en origen
+            for tenant in stale + [t for t in recopy if t in dst]:
+                remove_tenant(self.dst, tenant)
+                self.ckpt.record(tenant, "stale")
+            self._copy(recopy)
+        return False
+
+
+def _run(args) -> int:
+    ckpt = Checkpoint(args.checkpoint)
+    source = resolve_collection_name()
+    now = datetime.now(timezone.utc)
+    header = ckpt.header or {
+        "source": source,
+        "target": args.target or f"{COLLECTION_NAME}_{now:%Y%m%d%H%M%S}",
+        "model": args.model or default_embed_model(),
+        "started_at": now.isoformat(),
+    }
+    if ckpt.header:
+        if args.target and args.target != header["target"]:
+            print(f"El checkpoint apunta a '{header['target']}', no a '{args.target}'.", file=sys.stderr)
+            return 2
+        if args.model and args.model != header["model"]:
+            print(f"El checkpoint usa el modelo '{header['model']}', no '{args.model}'.", file=sys.stderr)
+            return 2
+        if header["source"] != source:
+            print(f"La colección activa es '{source}'; el checkpoint es de otra migración.", file=sys.stderr)
+            return 2
+        print(f"[reindex] retomando: {len(ckpt.done)} tenants ya copiados", flush=True)
+    if header["target"] == source:
+        print("La colección destino no puede ser la de origen.", file=sys.stderr)
+        return 2
+
+    if not _collection_exists(header["target"]):
+        create_collection(header["target"], embedding_model=header["model"])
+    ckpt.open(header)
+    print(f"[reindex] {source} -> {header['target']} (modelo {header['model']})", flush=True)
+
+    client = get_wv_client()
+    reindexer = Reindexer(
+        src=client.collections.get(source),
+        dst=client.collections.get(header["target"]),
+        checkpoint=ckpt,
+        model=header["model"],
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        tokens_per_min=args.max_tokens_per_min,
+        page_size=args.page_size,
+        report_every=args.report_every,
+        retries=args.retries,
+        activate_inactive=args.activate_inactive,
+    )
+    try:
+        reindexer.run()
+        in_sync = reindexer.reconcile(max_rounds=args.reconcile_rounds)
+    finally:
+        ckpt.close()
+
+    if reindexer.failed or reindexer.skipped:
+        print(f"[reindex] {len(reindexer.failed)} tenants fallidos y {len(reindexer.skipped)} omitidos "
+              f"(no activos); no se cambia el alias. Revisa {args.checkpoint} y relanza.", file=sys.stderr)
+        return 1
+    if not in_sync:
+        print(f"[reindex] el origen sigue cambiando tras {args.reconcile_rounds} rondas; "
+              "no se cambia el alias. Relanza en un momento con menos tráfico.", file=sys.stderr)
+        return 1
+    if args.no_switch:
+        print("[reindex] listo; alias sin cambiar (--no-switch).")
+        return 0
+
+    switch_alias(header["target"])
+    print(f"[reindex] alias '{COLLECTION_ALIAS}' -> '{header['target']}'.")
+    print(f"[reindex] la colección anterior '{source}' sigue existiendo; bórrala cuando quieras.")
+    return 0
+
+
+def main(argv: List[str] | None = None) -> int:
+    load_dotenv(find_dotenv(), override=False)
+
+    p = argparse.ArgumentParser(
+        description="Re-embedding offline de todos los tenants de DocChunk.",
+        epilog="El modelo se guarda en la colección nueva y el servicio lo toma de ahí tras el switch; "
+               "no cambies EMBEDDING_MODEL en el servicio.",
+    )
+    p.add_argument("--target", help=f"colección destino (por defecto {COLLECTION_NAME}_<timestamp>)")
+    p.add_argument("--checkpoint", default="reindex_checkpoint.jsonl")
+    p.add_argument("--model", default=None, help="modelo de embeddings (por defecto EMBEDDING_MODEL)")
+    p.add_argument("--batch-size", type=int, default=256, help="chunks por request de embeddings")
+    p.add_argument("--concurrency", type=int, default=8, help="requests de embeddings en paralelo")
+    p.add_argument("--max-tokens-per-min", type=float, default=0,
+                   help="límite de tokens enviados a embeddings (estimados con tiktoken); 0 = sin límite")
+    p.add_argument("--retries", type=int, default=5, help="reintentos ante errores transitorios de OpenAI")
+    p.add_argument("--page-size", type=int, default=500, help="tamaño de página del cursor de lectura")
+    p.add_argument("--report-every", type=float, default=10.0, help="segundos entre reportes")
+    p.add_argument("--reconcile-rounds", type=int, default=5, help="rondas máximas de reconciliación")
+    p.add_argument("--activate-inactive", action="store_true",
+                   help="activar temporalmente los tenants INACTIVE para copiarlos")
+    p.add_argument("--no-switch", action="store_true", help="no mover el alias al terminar")
+    args = p.parse_args(argv)
+
+    try:
+        return _run(args)
+    except RuntimeError as e:
+        print(f"[reindex] {e}", file=sys.stderr)
+        return 2
+    finally:
+        # solo si llegó a conectarse
+        if get_wv_client.cache_info().currsize:
+            get_wv_client().close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
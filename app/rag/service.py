@@ -4,7 +4,7 @@ import inspect
 from typing import List, Tuple
 from openai import OpenAI
 from .chunker import chunk_text
-from ..deps.weaviate_client import get_wv_client, COLLECTION_NAME, ensure_tenant
+from ..deps.weaviate_client import get_wv_client, ensure_tenant, active_collection
 from weaviate.classes.query import MetadataQuery
 
 def _get_openai():
@@ -13,13 +13,17 @@ def _get_openai():
         raise RuntimeError("OPENAI_API_KEY no está configurada.")
     return OpenAI(api_key=api_key)
 
-def _embed_model():
+def default_embed_model():
     # Asegúrate de que el modelo concuerde en dimension con tu colección (p.ej. ada-002 => 768)
     return os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
 
-def embed(texts: List[str]) -> List[List[float]]:
+def embed_model():
+    """Modelo de la colección activa (lo guarda el reindex); si no tiene, EMBEDDING_MODEL."""
+    return active_collection()[1] or default_embed_model()
+
+def embed(texts: List[str], model: str | None = None) -> List[List[float]]:
     client = _get_openai()
-    resp = client.embeddings.create(model=_embed_model(), input=texts)
+    resp = client.embeddings.create(model=model or embed_model(), input=texts)
     return [d.embedding for d in resp.data]
 
 def _set_tenant_param(kwargs: dict, func, nickname: str):
@@ -33,23 +37,26 @@ def _set_tenant_param(kwargs: dict, func, nickname: str):
     return False
 
 def ingest_text(nickname: str, raw_text: str) -> int:
-    ensure_tenant(nickname)
-    
+    # colección y modelo se resuelven una vez para que no cambien a mitad de la ingesta
+    collection, model = active_collection()
+    model = model or default_embed_model()
+    ensure_tenant(nickname, collection)
+
     size_tokens = int(os.getenv("CHUNK_TOKENS", "400"))
     overlap_tokens = int(os.getenv("CHUNK_OVERLAP_TOKENS", "100"))
     chunks = chunk_text(
         raw_text,
         size_tokens=size_tokens,
         overlap_tokens=overlap_tokens,
-        model_hint=_embed_model(),
+        model_hint=model,
     )
 
     if not chunks:
         return 0
 
-    vectors = embed(chunks)
+    vectors = embed(chunks, model=model)
     client = get_wv_client()
-    col = client.collections.get(COLLECTION_NAME)
+    col = client.collections.get(collection)
 
     # 1) batch con tenant(_name)
     batch_kwargs = {}
@@ -116,8 +123,9 @@ def ingest_text(nickname: str, raw_text: str) -> int:
 def retrieve(nickname: str, question: str, k: int | None = None) -> List[Tuple[str, int]]:
     limit_val = int(os.getenv("RAG_MAX_CHUNKS", "5")) if k is None else k
 
-    q_vec = embed([question])[0]
-    col = get_wv_client().collections.get(COLLECTION_NAME)
+    collection, model = active_collection()
+    q_vec = embed([question], model=model or default_embed_model())[0]
+    col = get_wv_client().collections.get(collection)
 
     query_kwargs = {
         "near_vector": q_vec,
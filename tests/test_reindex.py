@@ -0,0 +1,357 @@
+import json
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("weaviate")
+pytest.importorskip("openai")
+pytest.importorskip("dotenv")
+
+import httpx
+from openai import APITimeoutError
+from weaviate.exceptions import WeaviateBaseError
+
+from app.rag import reindex
+from app.rag.reindex import Checkpoint, Reindexer
+
+
+class FakeTenants:
+    def __init__(self, col):
+        self.col = col
+
+    def get(self):
+        return {
+            name: SimpleNamespace(name=name, activity_status=status)
+            for name, status in self.col.status.items()
+        }
+
+    def create(self, tenants):
+        for t in tenants if isinstance(tenants, list) else [tenants]:
+            if t.name in self.col.status:
+                raise WeaviateBaseError("already exists")
+            self.col.status[t.name] = "ACTIVE"
+            self.col.objects[t.name] = {}
+
+    def delete(self, names):
+        for name in names if isinstance(names, list) else [names]:
+            self.col.status.pop(name, None)
+            self.col.objects.pop(name, None)
+
+    def update(self, tenant):
+        self.col.status[tenant.name] = tenant.activity_status.value
+
+
+class FakeScoped:
+    def __init__(self, col, tenant):
+        self.col = col
+        self.tenant = tenant
+        self.data = SimpleNamespace(insert_many=self._insert_many)
+        self.aggregate = SimpleNamespace(over_all=self._over_all)
+
+    def _objects(self):
+        if self.col.status.get(self.tenant) != "ACTIVE":
+            raise RuntimeError(f"tenant {self.tenant} no activo")
+        return self.col.objects[self.tenant]
+
+    def iterator(self, return_properties=None, cache_size=None):
+        for uid, obj in list(self._objects().items()):
+            yield SimpleNamespace(uuid=uid, properties=dict(obj["properties"]))
+
+    def _insert_many(self, objs):
+        store = self._objects()
+        for o in objs:
+            store[o.uuid] = {"properties": o.properties, "vector": o.vector}
+        return SimpleNamespace(errors={})
+
+    def _over_all(self, total_count=False):
+        return SimpleNamespace(total_count=len(self._objects()))
+
+
+class FakeCollection:
+    def __init__(self, name, tenants=None):
+        self.name = name
+        self.status = {}
+        self.objects = {}
+        self.tenants = FakeTenants(self)
+        for tenant, texts in (tenants or {}).items():
+            self.add(tenant, texts)
+
+    def add(self, tenant, texts, status="ACTIVE"):
+        self.status[tenant] = status
+        store = self.objects.setdefault(tenant, {})
+        for i, text in enumerate(texts, start=len(store)):
+            store[str(uuid.uuid4())] = {
+                "properties": {"text": text, "source": "upload", "chunk_index": i},
+                "vector": None,
+            }
+
+    def with_tenant(self, tenant):
+        return FakeScoped(self, tenant)
+
+
+class FakeEmbed:
+    """Registra los textos recibidos; falla si aparece un texto de `fail_on`."""
+
+    def __init__(self, fail_on=(), transient_failures=0):
+        self.fail_on = set(fail_on)
+        self.transient_failures = transient_failures
+        self.calls = []
+
+    def __call__(self, texts, model=None):
+        assert all(t and t.strip() for t in texts), "texto vacío enviado a embeddings"
+        if self.transient_failures:
+            self.transient_failures -= 1
+            raise APITimeoutError(request=httpx.Request("POST", "https://api.openai.com"))
+        if self.fail_on & set(texts):
+            raise ValueError("bad request")
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+@pytest.fixture
+def fake_embed(monkeypatch):
+    def install(**kwargs):
+        fake = FakeEmbed(**kwargs)
+        monkeypatch.setattr(reindex, "embed", fake)
+        return fake
+    return install
+
+
+def _reindexer(src, dst, path, **kwargs):
+    ckpt = Checkpoint(str(path))
+    ckpt.open({"source": src.name, "target": dst.name, "model": "m"})
+    kwargs.setdefault("batch_size", 4)
+    kwargs.setdefault("concurrency", 2)
+    kwargs.setdefault("backoff", 0)
+    return Reindexer(src, dst, ckpt, model="m", **kwargs), ckpt
+
+
+def test_copies_every_tenant_including_empty_ones(tmp_path, fake_embed):
+    embed = fake_embed()
+    src = FakeCollection("Src", {"a": ["uno", "dos", "tres"], "b": [], "c": ["cuatro", ""]})
+    dst = FakeCollection("Dst")
+
+    r, ckpt = _reindexer(src, dst, tmp_path / "ckpt.jsonl")
+    r.run()
+
+    assert not r.failed
+    assert ckpt.done == {"a", "b", "c"}
+    assert set(dst.status) == {"a", "b", "c"}
+    assert dst.objects["b"] == {}
+    for tenant in ("a", "c"):
+        assert dst.objects[tenant].keys() == src.objects[tenant].keys()
+    # el chunk vacío se copia sin vector y no llega a la API
+    empty = [o for o in dst.objects["c"].values() if o["properties"]["text"] == ""]
+    assert len(empty) == 1 and empty[0]["vector"] is None
+    assert sum(len(c) for c in embed.calls) == 4
+
+
+def test_failed_batch_fails_only_its_tenants(tmp_path, fake_embed):
+    fake_embed(fail_on={"boom"})
+    # lote 1 = a + b (mezclados), lote 2 = c
+    src = FakeCollection("Src", {"a": ["a1", "a2"], "b": ["boom", "b2"], "c": ["c1", "c2", "c3", "c4"]})
+    dst = FakeCollection("Dst")
+
+    r, ckpt = _reindexer(src, dst, tmp_path / "ckpt.jsonl")
+    r.run()
+
+    assert set(r.failed) == {"a", "b"}
+    assert ckpt.done == {"c"}
+    assert len(dst.objects["c"]) == 4
+
+
+def test_transient_errors_are_retried(tmp_path, fake_embed):
+    fake_embed(transient_failures=2)
+    src = FakeCollection("Src", {"a": ["a1", "a2"]})
+    dst = FakeCollection("Dst")
+
+    r, ckpt = _reindexer(src, dst, tmp_path / "ckpt.jsonl", retries=3)
+    r.run()
+
+    assert not r.failed
+    assert ckpt.done == {"a"}
+
+
+def test_resume_only_copies_pending_tenants(tmp_path, fake_embed):
+    path = tmp_path / "ckpt.jsonl"
+    src = FakeCollection("Src", {"a": ["a1"], "b": ["boom"], "c": ["c1"]})
+    dst = FakeCollection("Dst")
+
+    fake_embed(fail_on={"boom"})
+    r, ckpt = _reindexer(src, dst, path, batch_size=1)
+    r.run()
+    ckpt.close()
+    assert set(r.failed) == {"b"}
+
+    embed = fake_embed()
+    r, ckpt = _reindexer(src, dst, path, batch_size=1)
+    assert ckpt.done == {"a", "c"}
+    r.run()
+
+    assert not r.failed
+    assert ckpt.done == {"a", "b", "c"}
+    assert embed.calls == [["boom"]]
+
+
+def test_truncated_checkpoint_line_is_not_merged(tmp_path):
+    path = tmp_path / "ckpt.jsonl"
+    header = {"source": "Src", "target": "Dst", "model": "m"}
+    path.write_text(
+        json.dumps(header) + "\n"
+        + json.dumps({"tenant": "x", "status": "done"}) + "\n"
+        + '{"tenant": "y", "sta'
+    )
+
+    ckpt = Checkpoint(str(path))
+    assert ckpt.done == {"x"}
+    ckpt.open(header)
+    ckpt.record("z", "done")
+    ckpt.close()
+
+    assert Checkpoint(str(path)).done == {"x", "z"}
+
+
+def test_truncated_header_is_rewritten(tmp_path):
+    path = tmp_path / "ckpt.jsonl"
+    path.write_text('{"source": "Sr')
+    header = {"source": "Src", "target": "Dst", "model": "m"}
+
+    ckpt = Checkpoint(str(path))
+    assert ckpt.header is None
+    ckpt.open(header)
+    ckpt.record("a", "done")
+    ckpt.close()
+
+    reloaded = Checkpoint(str(path))
+    assert reloaded.header == header
+    assert reloaded.done == {"a"}
+
+
+def test_checkpoint_without_header_is_rejected(tmp_path):
+    path = tmp_path / "ckpt.jsonl"
+    path.write_text(json.dumps({"tenant": "x", "status": "done"}) + "\n")
+
+    with pytest.raises(RuntimeError):
+        Checkpoint(str(path))
+
+
+def test_reconcile_picks_up_changes_made_during_the_run(tmp_path, fake_embed):
+    fake_embed()
+    src = FakeCollection("Src", {"a": ["a1"], "b": ["b1"], "gone": ["g1"]})
+    dst = FakeCollection("Dst")
+    r, ckpt = _reindexer(src, dst, tmp_path / "ckpt.jsonl")
+    r.run()
+
+    src.add("a", ["a2"])          # activate sobre un tenant ya copiado
+    src.tenants.delete("gone")    # deactivate
+    src.add("new", ["n1"])        # tenant creado tras la última pasada
+
+    assert r.reconcile()
+    assert set(dst.status) == {"a", "b", "new"}
+    assert dst.objects["a"].keys() == src.objects["a"].keys()
+    assert ckpt.done == {"a", "b", "new"}
+
+
+def test_inactive_tenants(tmp_path, fake_embed):
+    fake_embed()
+    src = FakeCollection("Src", {"a": ["a1"]})
+    src.add("cold", ["c1"], status="INACTIVE")
+    src.add("off", ["o1"], status="OFFLOADED")
+    dst = FakeCollection("Dst")
+
+    r, _ = _reindexer(src, dst, tmp_path / "skip.jsonl")
+    r.run()
+    assert r.skipped == {"cold": "INACTIVE", "off": "OFFLOADED"}
+    assert "cold" not in dst.status
+
+    dst = FakeCollection("Dst")
+    r, ckpt = _reindexer(src, dst, tmp_path / "activate.jsonl", activate_inactive=True)
+    r.run()
+    assert set(r.skipped) == {"off"}
+    assert ckpt.done == {"a", "cold"}
+    assert src.status["cold"] == dst.status["cold"] == "INACTIVE"
+    assert dst.objects["cold"].keys() == src.objects["cold"].keys()
+
+
+def _watch_done(ckpt, check):
+    """Llama a `check(tenant, rec)` justo antes de escribir cada registro `done`."""
+    record = ckpt.record
+
+    def wrapped(tenant, status, **extra):
+        if status == "done":
+            check(tenant, extra)
+        record(tenant, status, **extra)
+
+    ckpt.record = wrapped
+
+
+def test_done_is_recorded_after_the_buffered_batch_is_written(tmp_path, fake_embed):
+    fake_embed()
+    # ambos tenants caben en un solo lote: siguen en el buffer al terminar de leerlos
+    src = FakeCollection("Src", {"a": ["a1", "a2"], "b": ["b1"]})
+    dst = FakeCollection("Dst")
+    r, ckpt = _reindexer(src, dst, tmp_path / "ckpt.jsonl", batch_size=10)
+
+    seen = []
+
+    def check(tenant, extra):
+        assert dst.objects[tenant].keys() == src.objects[tenant].keys()
+        assert extra["chunks"] == len(src.objects[tenant])
+        seen.append(tenant)
+
+    _watch_done(ckpt, check)
+    r.run()
+
+    assert seen == ["a", "b"]
+    assert not r._written and not r._pending
+
+
+def test_inactive_tenant_is_restored_as_soon_as_it_is_copied(tmp_path, fake_embed):
+    fake_embed()
+    src = FakeCollection("Src")
+    src.add("cold", ["c1"], status="INACTIVE")
+    src.add("z", ["z1"])
+    dst = FakeCollection("Dst")
+    r, ckpt = _reindexer(src, dst, tmp_path / "ckpt.jsonl", batch_size=1, activate_inactive=True)
+
+    statuses = {}
+    _watch_done(ckpt, lambda tenant, extra: statuses.setdefault(tenant, dict(src.status)))
+    r.run()
+
+    # al terminar "cold" ya estaba INACTIVE otra vez, antes de copiar "z"
+    assert statuses["cold"]["cold"] == "INACTIVE"
+    assert ckpt.activated == {}
+
+
+def test_restart_restores_tenants_left_active_by_a_crash(tmp_path, fake_embed):
+    fake_embed()
+    path = tmp_path / "ckpt.jsonl"
+    path.write_text(
+        json.dumps({"source": "Src", "target": "Dst", "model": "m"}) + "\n"
+        + json.dumps({"tenant": "cold", "status": "activated", "activity_status": "INACTIVE"}) + "\n"
+    )
+    src = FakeCollection("Src", {"cold": ["c1"]})   # quedó ACTIVE tras el crash
+    dst = FakeCollection("Dst")
+
+    r, ckpt = _reindexer(src, dst, path)
+    r.run()
+
+    assert src.status["cold"] == "INACTIVE"
+    assert r.skipped == {"cold": "INACTIVE"}
+    assert Checkpoint(str(path)).activated == {}
+
+
+def test_reconcile_detects_reupload_with_same_count(tmp_path, fake_embed):
+    fake_embed()
+    src = FakeCollection("Src", {"a": ["a1", "a2"]})
+    dst = FakeCollection("Dst")
+    r, _ = _reindexer(src, dst, tmp_path / "ckpt.jsonl")
+    r.run()
+
+    # deactivate + activate con el mismo número de chunks
+    src.tenants.delete("a")
+    src.add("a", ["x1", "x2"])
+
+    assert r.reconcile()
+    assert dst.objects["a"].keys() == src.objects["a"].keys()
@@ -0,0 +1,33 @@
+import pytest
+
+pytest.importorskip("weaviate")
+
+from app.deps import weaviate_client
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(weaviate_client, "_active_cache", {"at": None, "value": None})
+
+
+def test_active_collection_is_cached(monkeypatch):
+    calls = []
+
+    def alias_target(name):
+        calls.append(name)
+        return "DocChunk_20260101000000"
+
+    monkeypatch.setattr(weaviate_client, "_alias_target", alias_target)
+    monkeypatch.setattr(weaviate_client, "_collection_embedding_model", lambda name: "text-embedding-3-small")
+
+    for _ in range(3):
+        assert weaviate_client.active_collection() == ("DocChunk_20260101000000", "text-embedding-3-small")
+    assert calls == [weaviate_client.COLLECTION_ALIAS]
+
+
+def test_active_collection_falls_back_without_alias(monkeypatch):
+    monkeypatch.setattr(weaviate_client, "_alias_target", lambda name: None)
+    monkeypatch.setattr(weaviate_client, "_collection_embedding_model", lambda name: None)
+    monkeypatch.setattr(weaviate_client, "ACTIVE_COLLECTION_TTL", 0)
+
+    assert weaviate_client.active_collection() == (weaviate_client.COLLECTION_NAME, None)